@@ -0,0 +1,125 @@
+"""
+Admission control for shedding load before it turns into queueing delay.
+
+Every route class tracks its requests in flight and two views of their
+latency: a fast moving average, and a slow baseline of how long requests
+take when nothing is queued. The gap between the two is the estimated
+queueing delay. When that passes the class's target, or the class is at its
+concurrency limit, new requests are turned away straight away instead of
+waiting behind the ones already admitted.
+
+That estimate only sees time spent once a request has been handed to the
+application. Time spent before that, in a proxy or the server's accept
+queue, is only known when the caller passes the request's measured wait to
+admit(), and a request that has already waited longer than the target is
+turned away too.
+"""
+import math
+import threading
+
+
+class _RouteState:
+    """Bookkeeping for one route class."""
+
+    __slots__ = ('lock', 'max_in_flight', 'target_delay', 'min_in_flight',
+                 'in_flight', 'latency', 'baseline')
+
+    def __init__(self, max_in_flight, target_delay, min_in_flight):
+        self.lock = threading.Lock()
+        self.max_in_flight = max_in_flight
+        self.target_delay = target_delay
+        self.min_in_flight = min_in_flight
+        self.in_flight = 0
+        self.latency = 0.0
+        self.baseline = None
+
+
+class AdmissionController:
+    """
+    Decide per route class whether to admit a request.
+
+    Args:
+        limits: Maps a route class name to a dict with max_in_flight (int),
+            target_delay (float, seconds) and optionally min_in_flight (int),
+            the number of requests always admitted so latency keeps being
+            measured while shedding (dict)
+        smoothing: Weight of the newest latency in the moving average (float)
+        baseline_drift: Fraction by which the baseline creeps up towards
+            slower requests, so it follows real changes in service time (float)
+    """
+
+    def __init__(self, limits, smoothing=0.2, baseline_drift=0.01):
+        self.smoothing = smoothing
+        self.baseline_drift = baseline_drift
+        self._routes = {
+            name: _RouteState(limit['max_in_flight'], limit['target_delay'],
+                              limit.get('min_in_flight', 1))
+            for name, limit in limits.items()
+        }
+
+    def admit(self, route_class, queue_wait=None):
+        """
+        Try to start a request of route_class.
+
+        Args:
+            route_class: The route class name (str)
+            queue_wait: Seconds the request waited between arriving and
+                reaching the application, if known. A request that waited
+                longer than target_delay is rejected even below
+                min_in_flight, since it carries its own measurement (float)
+
+        Returns:
+            bool: True if admitted, in which case release() must follow
+        """
+        state = self._routes[route_class]
+        with state.lock:
+            if state.in_flight >= state.max_in_flight:
+                return False
+            if queue_wait is not None and queue_wait > state.target_delay:
+                return False
+            if (state.in_flight >= state.min_in_flight
+                    and state.baseline is not None
+                    and state.latency - state.baseline > state.target_delay):
+                return False
+            state.in_flight += 1
+            return True
+
+    def release(self, route_class, elapsed):
+        """Finish an admitted request that took elapsed seconds."""
+        state = self._routes[route_class]
+        with state.lock:
+            state.in_flight -= 1
+            if state.baseline is None:
+                state.latency = state.baseline = elapsed
+                return
+            state.latency += self.smoothing * (elapsed - state.latency)
+            if elapsed < state.baseline:
+                state.baseline = elapsed
+            else:
+                state.baseline += self.baseline_drift * (elapsed - state.baseline)
+
+    def retry_after(self, route_class):
+        """
+        Suggest how long a rejected client should wait before retrying.
+
+        Returns:
+            int: Whole seconds, at least 1
+        """
+        state = self._routes[route_class]
+        return max(1, math.ceil(state.latency))
+
+    def stats(self, route_class):
+        """
+        Get the current bookkeeping of route_class.
+
+        Returns:
+            dict: in_flight, latency and queueing_delay (seconds)
+        """
+        state = self._routes[route_class]
+        with state.lock:
+            baseline = state.baseline if state.baseline is not None else state.latency
+            return {
+                'in_flight': state.in_flight,
+                'latency': state.latency,
+                'queueing_delay': max(0.0, state.latency - baseline)
+            }
@@ -1,11 +1,251 @@
 """
 REST API for Rock, Paper, Scissors, Lizard, Spock game.
 """
-from flask import Flask, request, jsonify, render_template
-from main import determine_winner, is_valid_choice, get_computer_choice, CHOICES
+import hashlib
+import hmac
+import os
+import time
+from functools import wraps
+from flask import Flask, request, jsonify, render_template, make_response, g
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+from main import is_valid_choice, get_computer_choice, CHOICES, RESULTS
+from idempotency import ResponseCache, CachedResponse
+from history import GameHistory, PAGE_FIELDS
+from practice import PracticeTally
+import export
+import play
+import ruleset
+from snapshot import SnapshotManager, SnapshotError
+from admission import AdmissionController
 
 app = Flask(__name__)
 
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+SESSION_HEADER = 'X-Session-Id'
+MAX_SESSION_LENGTH = 128
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+RULESET_MAX_AGE = 24 * 60 * 60
+
+# Limits per route class; see AdmissionController for the fields
+ADMISSION_LIMITS = {
+    'play': {'max_in_flight': 64, 'target_delay': 0.05},
+    'read': {'max_in_flight': 64, 'target_delay': 0.1},
+    # Exports are long streams, so only their concurrency is limited
+    'export': {'max_in_flight': 2, 'target_delay': float('inf')},
+}
+
+# Endpoints missing here, such as /health and /choices, are always admitted
+ADMISSION_ROUTE_CLASSES = {
+    'play_game': 'play',
+    'play_game_with_path': 'play',
+    'submit_results': 'play',
+    'get_history': 'read',
+    'get_practice': 'read',
+    'get_ruleset': 'read',
+    'export_games': 'export',
+}
+
+# Set by a front proxy to when it received the request, e.g. "t=1760000000.123"
+REQUEST_START_HEADER = 'X-Request-Start'
+# Off by default: the wait is measured across two clocks, so they must be in sync
+TRUST_REQUEST_START = os.environ.get('RPS_TRUST_REQUEST_START', '').lower() in ('1', 'true', 'yes')
+
+OVERLOADED_BODY = play.encode({
+    'error': 'Server is overloaded, please retry later'
+})
+
+# Operator credential for GET /export; exports are disabled while unset
+EXPORT_TOKEN = os.environ.get('RPS_EXPORT_TOKEN')
+
+SNAPSHOT_PATH = os.environ.get('RPS_SNAPSHOT_PATH')
+SNAPSHOT_INTERVAL = float(os.environ.get('RPS_SNAPSHOT_INTERVAL', 60))
+
+response_cache = ResponseCache()
+game_history = GameHistory()
+practice_tally = PracticeTally()
+admission_controller = AdmissionController(ADMISSION_LIMITS)
+
+snapshots = None
+if SNAPSHOT_PATH:
+    snapshots = SnapshotManager(SNAPSHOT_PATH)
+    snapshots.register('response_cache', response_cache)
+    snapshots.register('game_history', game_history)
+    snapshots.register('practice_tally', practice_tally)
+    try:
+        snapshots.restore()
+    except SnapshotError as error:
+        app.logger.warning('Starting cold, could not restore %s: %s', SNAPSHOT_PATH, error)
+
+
+@app.before_request
+def start_snapshots():
+    """
+    Start saving snapshots once this process serves its first request.
+    
+    If another process already saves to the same path, this one never does.
+    """
+    global snapshots
+    if snapshots is not None and not snapshots.start(SNAPSHOT_INTERVAL):
+        snapshots = None
+
+
+def _queue_wait():
+    """
+    Get how long the request waited before reaching the app, from X-Request-Start.
+    
+    The header holds the arrival time since the epoch, optionally prefixed
+    with "t=", in seconds, milliseconds or microseconds; the unit is told
+    apart by magnitude.
+    
+    The header is only honoured with RPS_TRUST_REQUEST_START set, since
+    any skew between the proxy's clock and this host's counts as waiting.
+    
+    Returns:
+        float: Seconds waited, or None when disabled or without a usable header
+    """
+    if not TRUST_REQUEST_START:
+        return None
+    value = request.headers.get(REQUEST_START_HEADER)
+    if not value:
+        return None
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max(0.0, time.time() - started)
+
+
+@app.before_request
+def admit_request():
+    """
+    Shed requests early with 503 while their route class is overloaded.
+    
+    With RPS_TRUST_REQUEST_START set, requests that already queued in front
+    of the app for longer than their class's target_delay, according to
+    X-Request-Start, are shed as well.
+    """
+    route_class = ADMISSION_ROUTE_CLASSES.get(request.endpoint)
+    if route_class is None:
+        return None
+    if not admission_controller.admit(route_class, _queue_wait()):
+        response = _json_response(OVERLOADED_BODY, 503)
+        response.headers['Retry-After'] = str(admission_controller.retry_after(route_class))
+        return response
+    g.admission = (route_class, time.perf_counter())
+    return None
+
+
+@app.teardown_request
+def release_request(error):
+    """Report how long an admitted request took."""
+    admitted = g.pop('admission', None)
+    if admitted is not None:
+        route_class, started = admitted
+        admission_controller.release(route_class, time.perf_counter() - started)
+
+
+def _release_on_close(response):
+    """
+    Keep a streamed response admitted until the server has finished sending it.
+    
+    teardown_request runs before a streamed body is sent, so the release is
+    moved to the response's close instead.
+    """
+    admitted = g.pop('admission', None)
+    if admitted is not None:
+        route_class, started = admitted
+        response.call_on_close(lambda: admission_controller.release(
+            route_class, time.perf_counter() - started))
+    return response
+
+
+def _replay(cached):
+    """Rebuild a response from its cached bytes."""
+    response = app.response_class(cached.body, status=cached.status,
+                                  mimetype=cached.mimetype)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _idempotency_conflict():
+    return jsonify({
+        'error': f'{IDEMPOTENCY_HEADER} was already used with a different request body'
+    }), 422
+
+
+def idempotent(view):
+    """
+    Replay the first successful response for a repeated Idempotency-Key header.
+
+    Keys are scoped to the caller (its X-Session-Id, or its address without
+    one) and to the request path, so the same key sent to /play and
+    /play/rock refers to two different plays. Reusing a key with a different
+    request body is rejected with 422. Only 2xx responses are stored, so a
+    client that fixes a rejected request can retry it with the same key.
+    
+    The key is claimed before the view runs, so a retry that arrives while
+    the original request is still running gets 409 instead of playing again.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return jsonify({
+                'error': f'{IDEMPOTENCY_HEADER} must be at most '
+                         f'{MAX_IDEMPOTENCY_KEY_LENGTH} characters'
+            }), 400
+
+        caller = request.headers.get(SESSION_HEADER) or request.remote_addr
+        cache_key = (caller, request.path, key)
+        fingerprint = hashlib.sha256(request.get_data()).digest()
+        cached, claimed = response_cache.claim(cache_key)
+        if cached is not None:
+            if cached.fingerprint != fingerprint:
+                return _idempotency_conflict()
+            return _replay(cached)
+        if not claimed:
+            response = jsonify({
+                'error': f'A request with this {IDEMPOTENCY_HEADER} is still in progress'
+            })
+            response.status_code = 409
+            response.headers['Retry-After'] = '1'
+            return response
+
+        # The view and its side effects only run while holding the claim
+        try:
+            response = make_response(view(*args, **kwargs))
+            if not 200 <= response.status_code < 300:
+                return response
+            fresh = CachedResponse(response.get_data(), response.status_code,
+                                   response.mimetype, fingerprint)
+            stored = response_cache.put_if_absent(cache_key, fresh)
+        finally:
+            response_cache.release(cache_key)
+        if stored is not fresh:
+            if stored.fingerprint != fingerprint:
+                return _idempotency_conflict()
+            return _replay(stored)
+        return response
+    return wrapper
+
+
+def _record_game(user_choice, computer_choice, result):
+    """Add a game to the history of the requesting session, if it sent one."""
+    session = request.headers.get(SESSION_HEADER)
+    if session and len(session) <= MAX_SESSION_LENGTH:
+        game_history.record(session, user_choice, computer_choice, result)
+
 
 @app.route('/')
 def index():
@@ -15,7 +255,30 @@ def index():
     return render_template('index.html')
 
 
+def _json_response(body, status):
+    """Wrap pre-encoded JSON bytes in a response without going through jsonify."""
+    return app.response_class(body, status=status, mimetype='application/json')
+
+
+def _play(choice):
+    """
+    Shared pipeline for both play endpoints.
+    
+    Resolves the choice through the precomputed choice table, throws for the
+    computer and answers with the pre-encoded body for that pair of moves.
+    """
+    user_choice = play.lookup_choice(choice)
+    if user_choice is None:
+        return _json_response(play.INVALID_CHOICE_BODY, 400)
+    
+    computer_choice = get_computer_choice()
+    _record_game(user_choice, computer_choice,
+                 play.OUTCOMES[user_choice, computer_choice])
+    return _json_response(play.PLAY_BODIES[user_choice, computer_choice], 200)
+
+
 @app.route('/play', methods=['POST'])
+@idempotent
 def play_game():
     """
     Play the game with a JSON payload.
@@ -23,72 +286,192 @@ def play_game():
     Expected JSON: {"choice": "rock"}
     Returns: {"user_choice": "rock", "computer_choice": "scissors", "result": "user", "message": "You win!"}
     """
+    if not request.is_json:
+        raise UnsupportedMediaType('Did not attempt to load JSON data because the '
+                                   'request Content-Type was not \'application/json\'.')
+    try:
+        data = play.loads(request.get_data())
+    except ValueError:
+        raise BadRequest('Failed to decode JSON object.')
+    
+    if not isinstance(data, dict) or 'choice' not in data:
+        return _json_response(play.MISSING_CHOICE_BODY, 400)
+    
+    return _play(data['choice'])
+
+
+@app.route('/play/<choice>', methods=['POST'])
+@idempotent
+def play_game_with_path(choice):
+    """
+    Play the game with choice in URL path.
+    
+    POST /play/rock
+    Returns: {"user_choice": "rock", "computer_choice": "scissors", "result": "user", "message": "You win!"}
+    """
+    return _play(choice)
+
+
+@app.route('/ruleset', methods=['GET'])
+def get_ruleset():
+    """
+    Get the compiled outcome table so clients can settle rounds locally.
+    
+    Returns: {"version": "...", "choices": [...], "results": ["user", "computer", "tie"], "outcomes": [[2, 1, 0, 0, 1], ...]}
+    """
+    response = _json_response(ruleset.BODY, 200)
+    response.set_etag(ruleset.VERSION)
+    response.cache_control.public = True
+    response.cache_control.max_age = RULESET_MAX_AGE
+    return response.make_conditional(request)
+
+
+@app.route('/results', methods=['POST'])
+@idempotent
+def submit_results():
+    """
+    Validate a batch of rounds settled locally with the ruleset.
+    
+    Accepted rounds are added to the practice totals of the requesting
+    session, if it sent one.
+    
+    Expected JSON: {"ruleset": "<version>", "rounds": [[0, 2, 0], ...]}
+    Returns: {"accepted": 1, "rejected": [], "totals": {"user": 1, "computer": 0, "tie": 0},
+              "session_totals": {"user": 7, "computer": 3, "tie": 2}}
+    """
     data = request.get_json()
     
-    if not data or 'choice' not in data:
+    if not isinstance(data, dict) or not isinstance(data.get('rounds'), list):
         return jsonify({
-            'error': 'Missing choice in request body',
-            'valid_choices': CHOICES
+            'error': 'Missing rounds in request body'
         }), 400
     
-    user_choice = data['choice'].lower()
-    
-    if not is_valid_choice(user_choice):
+    if data.get('ruleset') != ruleset.VERSION:
         return jsonify({
-            'error': 'Invalid choice',
-            'valid_choices': CHOICES
-        }), 400
+            'error': 'Ruleset version mismatch',
+            'ruleset': ruleset.VERSION
+        }), 409
     
-    computer_choice = get_computer_choice()
-    result = determine_winner(user_choice, computer_choice)
+    rounds = data['rounds']
+    if len(rounds) > ruleset.MAX_BATCH_ROUNDS:
+        return jsonify({
+            'error': f'At most {ruleset.MAX_BATCH_ROUNDS} rounds per batch'
+        }), 413
     
-    message_map = {
-        'user': 'You win!',
-        'computer': 'Computer wins!',
-        'tie': "It's a tie!"
+    totals, rejected = ruleset.validate_rounds(rounds)
+    body = {
+        'accepted': len(rounds) - len(rejected),
+        'rejected': rejected,
+        'totals': totals
     }
+    session = request.headers.get(SESSION_HEADER)
+    if session and len(session) <= MAX_SESSION_LENGTH:
+        body['session_totals'] = practice_tally.add(session, totals)
+    return jsonify(body), 200
+
+
+@app.route('/practice/<session>', methods=['GET'])
+def get_practice(session):
+    """
+    Get a session's totals of practice rounds accepted by /results.
     
+    Returns: {"session": "abc123", "totals": {"user": 7, "computer": 3, "tie": 2}}
+    """
     return jsonify({
-        'user_choice': user_choice,
-        'computer_choice': computer_choice,
-        'result': result,
-        'message': message_map[result]
+        'session': session,
+        'totals': practice_tally.totals(session)
     }), 200
 
 
-@app.route('/play/<choice>', methods=['POST'])
-def play_game_with_path(choice):
+@app.route('/history/<session>', methods=['GET'])
+def get_history(session):
     """
-    Play the game with choice in URL path.
+    Get a page of a session's game history, newest first.
     
-    POST /play/rock
-    Returns: {"user_choice": "rock", "computer_choice": "scissors", "result": "user", "message": "You win!"}
+    GET /history/abc123?limit=20&cursor=...&result=user&move=rock
+    Returns: {"fields": [...], "games": [[41, 1760000000.0, "rock", "scissors", "user"], ...], "next_cursor": "..."}
     """
-    user_choice = choice.lower()
-    
-    if not is_valid_choice(user_choice):
+    result = request.args.get('result')
+    if result is not None and result not in RESULTS:
         return jsonify({
-            'error': 'Invalid choice',
-            'valid_choices': CHOICES
+            'error': 'Invalid result filter',
+            'valid_results': list(RESULTS)
         }), 400
     
-    computer_choice = get_computer_choice()
-    result = determine_winner(user_choice, computer_choice)
+    move = request.args.get('move')
+    if move is not None:
+        move = move.lower()
+        if not is_valid_choice(move):
+            return jsonify({
+                'error': 'Invalid move filter',
+                'valid_choices': CHOICES
+            }), 400
     
-    message_map = {
-        'user': 'You win!',
-        'computer': 'Computer wins!',
-        'tie': "It's a tie!"
-    }
+    limit = request.args.get('limit', str(DEFAULT_PAGE_SIZE))
+    if not (limit.isascii() and limit.isdigit()) or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+        return jsonify({
+            'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'
+        }), 400
+    
+    try:
+        games, next_cursor = game_history.page(session, limit=int(limit),
+                                               cursor=request.args.get('cursor'),
+                                               result=result, move=move)
+    except ValueError:
+        return jsonify({
+            'error': 'Invalid cursor'
+        }), 400
     
     return jsonify({
-        'user_choice': user_choice,
-        'computer_choice': computer_choice,
-        'result': result,
-        'message': message_map[result]
+        'fields': PAGE_FIELDS,
+        'games': [[position, game.timestamp, game.user_choice,
+                   game.computer_choice, game.result]
+                  for position, game in games],
+        'next_cursor': next_cursor
     }), 200
 
 
+@app.route('/export', methods=['GET'])
+def export_games():
+    """
+    Stream every recorded game in a columnar format.
+    
+    GET /export?format=arrow (default) or GET /export?format=parquet
+    Authorization: Bearer <RPS_EXPORT_TOKEN>
+    Returns: An Arrow IPC stream or Parquet file, one record batch or row group at a time
+    """
+    if not EXPORT_TOKEN:
+        return jsonify({
+            'error': 'Export is disabled: RPS_EXPORT_TOKEN is not set'
+        }), 403
+    
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(),
+                                                             EXPORT_TOKEN.encode()):
+        response = jsonify({
+            'error': 'Export requires the operator token'
+        })
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response, 401
+    
+    fmt = request.args.get('format', 'arrow')
+    if fmt not in export.FORMATS:
+        return jsonify({
+            'error': 'Invalid export format',
+            'valid_formats': list(export.FORMATS)
+        }), 400
+    
+    if not export.is_available():
+        return jsonify({
+            'error': 'Export is not available: pyarrow is not installed'
+        }), 501
+    
+    mimetype, filename = export.FORMATS[fmt]
+    response = app.response_class(export.stream(game_history, fmt), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return _release_on_close(response)
+
+
 @app.route('/choices', methods=['GET'])
 def get_choices():
     """
@@ -121,6 +504,11 @@ def not_found(error):
         'available_endpoints': {
             'POST /play': 'Play with JSON body: {"choice": "rock"}',
             'POST /play/<choice>': 'Play with URL path: /play/rock',
+            'GET /ruleset': 'Get the outcome table for settling rounds locally',
+            'POST /results': 'Validate a batch of locally settled rounds',
+            'GET /practice/<session>': 'Get a session\'s practice round totals',
+            'GET /history/<session>': 'Get a page of a session\'s game history',
+            'GET /export': 'Stream all games as Arrow or Parquet (operator token required)',
             'GET /choices': 'Get all valid choices',
             'GET /health': 'Health check'
         }
@@ -0,0 +1,175 @@
+"""
+Columnar export of the recorded game history to Parquet and Arrow.
+
+Games are written in row groups of CHUNK_SIZE rows, so an export only ever
+holds one chunk in memory however large the history is. Move and result
+columns are dictionary-encoded against main.CHOICES and the result codes.
+
+pyarrow is an optional dependency; it is only needed to export.
+"""
+from main import CHOICES, RESULTS
+from history import GameRecord
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+CHUNK_SIZE = 64 * 1024
+
+FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'games.parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'games.arrow'),
+}
+
+_CHOICE_CODES = {choice: code for code, choice in enumerate(CHOICES)}
+_RESULT_CODES = {result: code for code, result in enumerate(RESULTS)}
+
+
+def is_available():
+    """
+    Check whether pyarrow is installed.
+
+    Returns:
+        bool: True if exports can be written, False otherwise
+    """
+    return pa is not None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError('pyarrow is required to export games: pip install pyarrow')
+
+
+def schema():
+    """
+    Get the Arrow schema of exported games.
+
+    Returns:
+        pyarrow.Schema: One column per GameRecord field plus the game id
+    """
+    _require_pyarrow()
+    move = pa.dictionary(pa.int8(), pa.string())
+    return pa.schema([
+        ('session', pa.string()),
+        ('id', pa.int64()),
+        ('timestamp', pa.timestamp('ms', tz='UTC')),
+        ('user_choice', move),
+        ('computer_choice', move),
+        ('result', pa.dictionary(pa.int8(), pa.string())),
+    ])
+
+
+def _record_batch(chunk, export_schema, choices, results):
+    ids = [position for start, games in chunk
+           for position in range(start, start + len(games))]
+    sessions, timestamps, user_choices, computer_choices, game_results = (
+        [game[field] for _, games in chunk for game in games]
+        for field in range(len(GameRecord._fields)))
+
+    def encoded(values, codes, dictionary):
+        indices = pa.array(list(map(codes.__getitem__, values)), pa.int8())
+        return pa.DictionaryArray.from_arrays(indices, dictionary)
+
+    seconds = pa.array(timestamps, pa.float64())
+    milliseconds = pc.cast(pc.multiply(seconds, 1000), pa.int64(), safe=False)
+    return pa.record_batch([
+        pa.array(sessions, pa.string()),
+        pa.array(ids, pa.int64()),
+        milliseconds.cast(export_schema.field('timestamp').type),
+        encoded(user_choices, _CHOICE_CODES, choices),
+        encoded(computer_choices, _CHOICE_CODES, choices),
+        encoded(game_results, _RESULT_CODES, results),
+    ], schema=export_schema)
+
+
+def iter_record_batches(history, chunk_size=CHUNK_SIZE):
+    """
+    Convert a GameHistory into Arrow record batches of at most chunk_size rows.
+    """
+    _require_pyarrow()
+    export_schema = schema()
+    choices = pa.array(CHOICES, pa.string())
+    results = pa.array(RESULTS, pa.string())
+    for chunk in history.iter_chunks(chunk_size):
+        yield _record_batch(chunk, export_schema, choices, results)
+
+
+def _open_writer(sink, fmt):
+    if fmt == 'parquet':
+        return pq.ParquetWriter(sink, schema(), compression='zstd')
+    if fmt == 'arrow':
+        return pa.ipc.new_stream(sink, schema())
+    raise ValueError(f'Unknown export format: {fmt}')
+
+
+def write(history, sink, fmt='parquet', chunk_size=CHUNK_SIZE):
+    """
+    Write every recorded game to a file path or binary file object.
+
+    Args:
+        history: The GameHistory to export
+        sink: A path or writable binary file object
+        fmt: 'parquet' or 'arrow' (str)
+        chunk_size: Rows per row group or record batch (int)
+
+    Returns:
+        int: The number of games written
+    """
+    _require_pyarrow()
+    rows = 0
+    with _open_writer(sink, fmt) as writer:
+        for batch in iter_record_batches(history, chunk_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+class _ChunkSink:
+    """A write-only file object whose buffered bytes are drained by a generator."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def stream(history, fmt='arrow', chunk_size=CHUNK_SIZE):
+    """
+    Yield an export as byte strings, one per row group or record batch.
+
+    Only the chunk being encoded is held in memory, so this can back a
+    streaming HTTP response of any size.
+    """
+    _require_pyarrow()
+    sink = _ChunkSink()
+    writer = _open_writer(sink, fmt)
+    for batch in iter_record_batches(history, chunk_size):
+        writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,282 @@
+"""
+Per-session game history with keyset-paginated, indexed lookups.
+"""
+import base64
+import binascii
+import pickle
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+GameRecord = namedtuple('GameRecord', ['session', 'timestamp', 'user_choice',
+                                       'computer_choice', 'result'])
+
+PAGE_FIELDS = ('id', 'timestamp', 'user_choice', 'computer_choice', 'result')
+
+
+def encode_cursor(position):
+    """
+    Turn a record position into an opaque cursor string.
+    """
+    return base64.urlsafe_b64encode(str(position).encode()).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    """
+    Turn an opaque cursor string back into a record position.
+
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if position < 0:
+        raise ValueError('Invalid cursor')
+    return position
+
+
+class _SessionLog:
+    """
+    The retained games of one session plus posting lists for every filter.
+
+    Positions are counted from the session's first game ever and never
+    change. base is the position of the oldest retained game, so the game
+    at position p is records[p - base].
+
+    postings maps (result, move) to the ascending positions of the matching
+    records, with None standing for "any". The unfiltered list is the
+    records list itself.
+
+    Appends happen in place, while trimming builds new lists. A reader that
+    took a view under the lock can therefore keep using it afterwards.
+
+    A log restored from a snapshot stays packed until it is first used, so
+    restoring costs nothing per game.
+    """
+
+    __slots__ = ('_base', '_records', '_postings', 'packed', '_packed_length')
+
+    def __init__(self, packed=None, packed_length=0):
+        self._base = 0
+        self._records = []
+        self._postings = {}
+        self.packed = packed
+        self._packed_length = packed_length
+
+    def _unpack(self):
+        self._base, self._records, self._postings = pickle.loads(self.packed)
+        self.packed = None
+
+    def view(self):
+        """
+        Capture the log for reading outside the lock.
+
+        Returns:
+            tuple: (base, records, postings, number of games)
+        """
+        if self.packed is not None:
+            self._unpack()
+        return self._base, self._records, self._postings, len(self._records)
+
+    def __len__(self):
+        if self.packed is not None:
+            return self._packed_length
+        return len(self._records)
+
+    def append(self, record):
+        base, records, postings, count = self.view()
+        position = base + count
+        records.append(record)
+        for key in ((record.result, None), (None, record.user_choice),
+                    (record.result, record.user_choice)):
+            postings.setdefault(key, []).append(position)
+
+    def trim(self, count):
+        """Forget the oldest count games."""
+        base, records, postings, _ = self.view()
+        self._base = base + count
+        self._records = records[count:]
+        self._postings = {}
+        for key, positions in postings.items():
+            kept = positions[bisect_left(positions, self._base):]
+            if kept:
+                self._postings[key] = kept
+
+
+def _pack(base, records, postings, count):
+    """Pickle the first count games of a log view and their postings."""
+    end = base + count
+    return pickle.dumps((base, records[:count],
+                         {key: positions[:bisect_left(positions, end)]
+                          for key, positions in list(postings.items())}),
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class GameHistory:
+    """
+    In-memory store of played games, grouped by session.
+
+    Pages are returned newest first. A cursor marks the position of the last
+    record on a page, and the next page is found by bisecting the matching
+    posting list, so every page costs O(log n + page size) however deep it is.
+
+    Memory is bounded. A session keeps at most max_session_games games; once
+    it passes that, its oldest quarter is dropped. Past max_sessions sessions
+    or max_games games in total, whole sessions are evicted least recently
+    used first.
+
+    Args:
+        max_sessions: Maximum number of sessions kept (int)
+        max_games: Maximum number of games kept across all sessions (int)
+        max_session_games: Maximum number of games kept per session (int)
+    """
+
+    SNAPSHOT_VERSION = 2
+
+    def __init__(self, max_sessions=10000, max_games=1000000, max_session_games=10000):
+        if max_session_games > max_games:
+            raise ValueError('max_session_games must not exceed max_games')
+        self.max_sessions = max_sessions
+        self.max_games = max_games
+        self.max_session_games = max_session_games
+        self._sessions = OrderedDict()
+        self._games = 0
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        while len(self._sessions) > self.max_sessions or self._games > self.max_games:
+            _, log = self._sessions.popitem(last=False)
+            self._games -= len(log)
+
+    def record(self, session, user_choice, computer_choice, result, timestamp=None):
+        """
+        Append a finished game to a session's history.
+
+        Returns:
+            GameRecord: The stored record
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        record = GameRecord(session, timestamp, user_choice, computer_choice, result)
+        with self._lock:
+            log = self._sessions.get(session)
+            if log is None:
+                log = self._sessions[session] = _SessionLog()
+            else:
+                self._sessions.move_to_end(session)
+            log.append(record)
+            self._games += 1
+            if len(log) > self.max_session_games:
+                drop = len(log) - self.max_session_games * 3 // 4
+                log.trim(drop)
+                self._games -= drop
+            self._evict()
+        return record
+
+    def page(self, session, limit=20, cursor=None, result=None, move=None):
+        """
+        Fetch one page of a session's games, newest first.
+
+        Args:
+            session: The session identifier (str)
+            limit: Maximum number of games to return (int)
+            cursor: The next_cursor of the previous page, or None to start (str)
+            result: Only return games with this result code (str)
+            move: Only return games where the user threw this choice (str)
+
+        Returns:
+            tuple: ([(position, GameRecord), ...], next_cursor or None)
+
+        Raises:
+            ValueError: If the cursor is invalid
+        """
+        with self._lock:
+            log = self._sessions.get(session)
+            if log is None:
+                return [], None
+            self._sessions.move_to_end(session)
+            base, records, postings, count = log.view()
+            if result is None and move is None:
+                positions = range(base, base + count)
+            else:
+                positions = postings.get((result, move), [])
+            end = len(positions)
+            if cursor is not None:
+                end = bisect_left(positions, decode_cursor(cursor))
+            start = max(0, end - limit)
+            games = [(positions[i], records[positions[i] - base])
+                     for i in range(end - 1, start - 1, -1)]
+
+        next_cursor = encode_cursor(games[-1][0]) if start > 0 else None
+        return games, next_cursor
+
+    def iter_chunks(self, size):
+        """
+        Yield every recorded game in chunks of at most size games.
+
+        Each chunk is a list of (start_position, [GameRecord, ...]) runs, one
+        per session it touches, so no per-game objects are built. The lock is
+        only held while taking a view of each session, so recording carries
+        on during a long walk. Games recorded after the walk reaches a
+        session are not included.
+        """
+        with self._lock:
+            logs = list(self._sessions.values())
+        chunk = []
+        count = 0
+        for log in logs:
+            with self._lock:
+                base, records, _, end = log.view()
+            offset = 0
+            while offset < end:
+                take = min(size - count, end - offset)
+                chunk.append((base + offset, records[offset:offset + take]))
+                offset += take
+                count += take
+                if count == size:
+                    yield chunk
+                    chunk = []
+                    count = 0
+        if chunk:
+            yield chunk
+
+    def snapshot(self):
+        """
+        Capture every session for a snapshot, least recently used first.
+
+        Only views of the logs are taken under the lock; the pickling happens
+        afterwards while games keep being recorded. Sessions that have not
+        been touched since they were restored are passed through still packed.
+
+        Returns:
+            list: (session, game count, pickled log) tuples
+        """
+        with self._lock:
+            logs = [(session, len(log), log.packed if log.packed is not None else log.view())
+                    for session, log in self._sessions.items()]
+        return [(session, count, packed if isinstance(packed, bytes) else _pack(*packed))
+                for session, count, packed in logs]
+
+    def restore(self, state):
+        """
+        Load sessions captured by snapshot(), keeping any already recorded.
+
+        Each session is only unpickled when it is first read or written. If
+        the snapshot holds more than the budget allows, the least recently
+        used sessions are evicted.
+        """
+        with self._lock:
+            # Restored sessions count as older than any recorded since startup
+            for session, count, packed in reversed(state):
+                if session not in self._sessions:
+                    self._sessions[session] = _SessionLog(packed, count)
+                    self._sessions.move_to_end(session, last=False)
+                    self._games += count
+            self._evict()
+
+    def __len__(self):
+        return self._games
@@ -0,0 +1,181 @@
+"""
+Idempotency-Key response cache for the play endpoints.
+
+Stores the first response produced for a key so that retries are answered
+with exactly the same bytes instead of a fresh random computer choice.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# fingerprint identifies the request body the response was produced for
+CachedResponse = namedtuple('CachedResponse', ['body', 'status', 'mimetype',
+                                               'fingerprint'])
+
+
+class _Shard:
+    """One independently locked LRU segment of a ResponseCache."""
+
+    __slots__ = ('lock', 'entries', 'bytes', 'claimed')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.claimed = set()
+
+
+class ResponseCache:
+    """
+    Bounded, TTL-expiring LRU cache of responses keyed by idempotency key.
+
+    Entries are spread over several shards, each with its own lock and its
+    own share of the entry and byte budgets, so concurrent requests only
+    contend when their keys hash to the same shard. Lookups, inserts and
+    evictions are O(1).
+
+    Args:
+        max_entries: Maximum number of cached responses (int)
+        max_bytes: Maximum total size of cached keys and bodies (int)
+        ttl: Seconds a response stays replayable (float)
+        shards: Number of independently locked segments (int)
+    """
+
+    SNAPSHOT_VERSION = 2
+
+    def __init__(self, max_entries=10000, max_bytes=8 * 1024 * 1024,
+                 ttl=24 * 60 * 60, shards=16):
+        if max_entries < shards or max_bytes < shards:
+            raise ValueError('max_entries and max_bytes must be at least shards')
+        self.ttl = ttl
+        self._shards = [_Shard() for _ in range(shards)]
+        self._shard_entries = max_entries // shards
+        self._shard_bytes = max_bytes // shards
+
+    def _shard_for(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    @staticmethod
+    def _size(key, response):
+        return len(repr(key)) + len(response.body) + len(response.fingerprint)
+
+    def _pop(self, shard, key):
+        expires_at, response = shard.entries.pop(key)
+        shard.bytes -= self._size(key, response)
+
+    def get(self, key):
+        """
+        Return the cached response for key, or None if absent or expired.
+        """
+        shard = self._shard_for(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._pop(shard, key)
+                return None
+            shard.entries.move_to_end(key)
+            return entry[1]
+
+    def claim(self, key):
+        """
+        Reserve key for a request that is about to produce its response.
+
+        Only one request at a time can hold a key, so a retry that arrives
+        while the original is still running does not run it a second time.
+        Claims are not cached responses: they are not counted against the
+        budgets and are not snapshotted.
+
+        Returns:
+            tuple: (cached response or None, True if key was claimed). A key
+            is only claimed when nothing is cached for it and no other
+            request holds it, in which case release() must follow.
+        """
+        shard = self._shard_for(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    shard.entries.move_to_end(key)
+                    return entry[1], False
+                self._pop(shard, key)
+            if key in shard.claimed:
+                return None, False
+            shard.claimed.add(key)
+            return None, True
+
+    def release(self, key):
+        """Give up a claim taken by claim()."""
+        shard = self._shard_for(key)
+        with shard.lock:
+            shard.claimed.discard(key)
+
+    def put_if_absent(self, key, response):
+        """
+        Store response under key unless a live entry already exists.
+
+        Returns:
+            CachedResponse: The response now associated with key. This is the
+            earlier one when a concurrent request with the same key won.
+        """
+        shard = self._shard_for(key)
+        size = self._size(key, response)
+        now = time.monotonic()
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    shard.entries.move_to_end(key)
+                    return entry[1]
+                self._pop(shard, key)
+            self._insert(shard, key, response, size, now + self.ttl)
+        return response
+
+    def _insert(self, shard, key, response, size, expires_at):
+        if size > self._shard_bytes:
+            return
+        shard.entries[key] = (expires_at, response)
+        shard.bytes += size
+        while (len(shard.entries) > self._shard_entries
+               or shard.bytes > self._shard_bytes):
+            self._pop(shard, next(iter(shard.entries)))
+
+    def clear(self):
+        """Drop every cached response."""
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.bytes = 0
+
+    def snapshot(self):
+        """
+        Capture the live entries for a snapshot.
+
+        Expiry times are stored as seconds remaining, since monotonic clock
+        readings mean nothing in another process.
+
+        Returns:
+            list: (key, seconds_remaining, CachedResponse) tuples, least recently used first
+        """
+        now = time.monotonic()
+        entries = []
+        for shard in self._shards:
+            with shard.lock:
+                entries.extend((key, expires_at - now, response)
+                               for key, (expires_at, response) in shard.entries.items()
+                               if expires_at > now)
+        return entries
+
+    def restore(self, entries):
+        """Load entries captured by snapshot(), keeping any already cached."""
+        now = time.monotonic()
+        for key, remaining, response in entries:
+            shard = self._shard_for(key)
+            with shard.lock:
+                if key not in shard.entries:
+                    self._insert(shard, key, response, self._size(key, response),
+                                 now + remaining)
+
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self._shards)
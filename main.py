@@ -14,6 +14,12 @@ WINS = {
     'spock': ['rock', 'scissors']
 }
 
+# Result codes returned by determine_winner
+USER = 'user'
+COMPUTER = 'computer'
+TIE = 'tie'
+RESULTS = (USER, COMPUTER, TIE)
+
 def determine_winner(user_choice, computer_choice):
     """
     Determine the winner of the game.
@@ -26,11 +32,11 @@ def determine_winner(user_choice, computer_choice):
         str: 'user' if user wins, 'computer' if computer wins, 'tie' if tie
     """
     if user_choice == computer_choice:
-        return 'tie'
+        return TIE
     elif computer_choice in WINS[user_choice]:
-        return 'user'
+        return USER
     else:
-        return 'computer'
+        return COMPUTER
 
 def is_valid_choice(choice):
     """
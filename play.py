@@ -0,0 +1,88 @@
+"""
+Precomputed tables and pre-encoded response bodies for the play endpoints.
+
+Everything a play request needs is built once at import time from
+main.CHOICES and main.determine_winner, so handling a throw is a couple of
+dictionary lookups and no JSON encoding.
+"""
+import itertools
+import json
+from main import CHOICES, determine_winner
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Both raise a ValueError subclass on malformed input
+loads = orjson.loads if orjson is not None else json.loads
+
+MESSAGES = {
+    'user': 'You win!',
+    'computer': 'Computer wins!',
+    'tie': "It's a tie!"
+}
+
+
+def encode(obj):
+    """
+    Encode obj byte-for-byte the way Flask's jsonify does outside debug mode.
+
+    Args:
+        obj: A JSON-serializable object
+
+    Returns:
+        bytes: Compact JSON with sorted keys and a trailing newline
+    """
+    return (json.dumps(obj, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def _case_variants(word):
+    return {''.join(letters) for letters in
+            itertools.product(*({char.lower(), char.upper()} for char in word))}
+
+
+# Every upper/lower-case spelling of every choice, mapped to the choice
+CHOICE_TABLE = {variant: choice for choice in CHOICES
+                for variant in _case_variants(choice)}
+
+OUTCOMES = {(user_choice, computer_choice): determine_winner(user_choice, computer_choice)
+            for user_choice in CHOICES for computer_choice in CHOICES}
+
+PLAY_BODIES = {
+    (user_choice, computer_choice): encode({
+        'user_choice': user_choice,
+        'computer_choice': computer_choice,
+        'result': result,
+        'message': MESSAGES[result]
+    })
+    for (user_choice, computer_choice), result in OUTCOMES.items()
+}
+
+MISSING_CHOICE_BODY = encode({
+    'error': 'Missing choice in request body',
+    'valid_choices': CHOICES
+})
+
+INVALID_CHOICE_BODY = encode({
+    'error': 'Invalid choice',
+    'valid_choices': CHOICES
+})
+
+
+def lookup_choice(choice):
+    """
+    Resolve a user-supplied choice in any letter case.
+
+    The table covers plain ASCII case; other spellings that lower() folds
+    onto a choice, such as a Kelvin sign for "k", fall back to lower().
+
+    Args:
+        choice: The raw choice from the request (any type)
+
+    Returns:
+        str: The canonical choice, or None if it is not a valid choice
+    """
+    if not isinstance(choice, str):
+        return None
+    return CHOICE_TABLE.get(choice) or CHOICE_TABLE.get(choice.lower())
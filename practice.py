@@ -0,0 +1,94 @@
+"""
+Running totals of practice rounds settled locally and submitted to /results.
+
+Practice rounds are only counted, never stored one by one, and are kept
+apart from the played games in history.GameHistory.
+"""
+import threading
+from collections import OrderedDict
+from main import RESULTS
+
+
+class PracticeTally:
+    """
+    Per-session counts of accepted practice rounds by result code.
+
+    Sessions are evicted least recently used first once there are more than
+    max_sessions of them.
+
+    Args:
+        max_sessions: Maximum number of sessions kept (int)
+    """
+
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, max_sessions=10000):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, session, totals):
+        """
+        Add a validated batch's tallies to a session's totals.
+
+        Args:
+            session: The session identifier (str)
+            totals: Counts by result code, as returned by ruleset.validate_rounds (dict)
+
+        Returns:
+            dict: The session's totals including this batch
+        """
+        with self._lock:
+            counts = self._sessions.get(session)
+            if counts is None:
+                counts = self._sessions[session] = [0] * len(RESULTS)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session)
+            for index, result in enumerate(RESULTS):
+                counts[index] += totals.get(result, 0)
+            return dict(zip(RESULTS, counts))
+
+    def totals(self, session):
+        """
+        Get a session's totals.
+
+        Returns:
+            dict: Counts by result code, all zero for an unknown session
+        """
+        with self._lock:
+            counts = self._sessions.get(session)
+            if counts is None:
+                return dict.fromkeys(RESULTS, 0)
+            self._sessions.move_to_end(session)
+            return dict(zip(RESULTS, counts))
+
+    def snapshot(self):
+        """
+        Capture every session's totals, least recently used first.
+
+        Returns:
+            list: (session, [count per result code]) tuples
+        """
+        with self._lock:
+            return [(session, list(counts)) for session, counts in self._sessions.items()]
+
+    def restore(self, state):
+        """
+        Load totals captured by snapshot(), keeping any already recorded.
+        """
+        for session, counts in state:
+            if len(counts) != len(RESULTS):
+                raise ValueError(f'Expected {len(RESULTS)} counts for {session!r}')
+        with self._lock:
+            # Restored sessions count as older than any recorded since startup
+            for session, counts in reversed(state):
+                if session not in self._sessions:
+                    self._sessions[session] = list(counts)
+                    self._sessions.move_to_end(session, last=False)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def __len__(self):
+        return len(self._sessions)
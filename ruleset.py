@@ -0,0 +1,55 @@
+"""
+Compiled ruleset that clients can download to settle rounds locally.
+
+The outcome table is compiled once from play.OUTCOMES (main.CHOICES and
+main.WINS) and served pre-encoded. Its version is a hash of the table, so it
+only changes when the rules do.
+"""
+import hashlib
+from main import CHOICES, RESULTS
+from play import OUTCOMES, encode
+
+MAX_BATCH_ROUNDS = 10000
+
+# outcomes[user][computer] is the index in RESULTS of the round's result
+OUTCOME_CODES = [[RESULTS.index(OUTCOMES[user_choice, computer_choice])
+                  for computer_choice in CHOICES]
+                 for user_choice in CHOICES]
+
+VERSION = hashlib.sha256(encode([CHOICES, RESULTS, OUTCOME_CODES])).hexdigest()[:16]
+
+BODY = encode({
+    'version': VERSION,
+    'choices': CHOICES,
+    'results': RESULTS,
+    'outcomes': OUTCOME_CODES
+})
+
+# Every correctly settled round as a (user, computer, result) index triple
+_VALID_ROUNDS = frozenset(
+    (user, computer, result)
+    for user, row in enumerate(OUTCOME_CODES)
+    for computer, result in enumerate(row)
+)
+
+
+def validate_rounds(rounds):
+    """
+    Check a batch of locally settled rounds against the outcome table.
+
+    Args:
+        rounds: [user, computer, result] index triples (list)
+
+    Returns:
+        tuple: (tallies of valid rounds by result code (dict), indices of invalid rounds (list))
+    """
+    counts = [0] * len(RESULTS)
+    rejected = []
+    for index, played in enumerate(rounds):
+        if (type(played) is list and len(played) == 3
+                and all(type(code) is int for code in played)
+                and tuple(played) in _VALID_ROUNDS):
+            counts[played[2]] += 1
+        else:
+            rejected.append(index)
+    return dict(zip(RESULTS, counts)), rejected
@@ -0,0 +1,262 @@
+"""
+Warm-start snapshots of the in-memory stores.
+
+Registered stores are periodically written to a single binary file in a
+background thread and loaded back through a memory map on startup.
+
+Only one process may save to a snapshot file. The background thread holds an
+exclusive lock on a companion ".lock" file, and a second process pointed at
+the same path does not start saving. Run a single worker process, or give
+every worker its own path.
+
+A store is any object with a SNAPSHOT_VERSION attribute and a pair of
+snapshot() / restore(state) methods. snapshot() must return a picklable
+value and should hold its locks only long enough to capture a consistent
+view; the pickling and writing happen outside of them.
+
+File layout (little-endian):
+    header:  magic (8 bytes), format version (uint16), section count (uint16)
+    section: name length (uint16), name (utf-8), store version (uint16),
+             payload length (uint64), payload CRC-32 (uint32), payload (pickle)
+"""
+import atexit
+import logging
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAGIC = b'RPSLSNAP'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<8sHH')
+_NAME_LENGTH = struct.Struct('<H')
+_SECTION = struct.Struct('<HQI')
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is unreadable or corrupt."""
+
+
+class SnapshotManager:
+    """
+    Save registered stores to a snapshot file and restore them from it.
+
+    Args:
+        path: The snapshot file (str)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._stores = {}
+        self._thread = None
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._save_lock = threading.Lock()
+
+    def register(self, name, store):
+        """Include store in every snapshot under name."""
+        if len(name.encode()) > 0xFFFF:
+            raise ValueError('Store name is too long')
+        self._stores[name] = store
+
+    def save(self):
+        """
+        Write every registered store to the snapshot file.
+
+        The file is written next to its final location and then renamed over
+        it, so readers only ever see a complete snapshot.
+
+        Returns:
+            int: The size of the snapshot in bytes
+        """
+        with self._save_lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(self._stores)))
+                    for name, store in self._stores.items():
+                        payload = pickle.dumps(store.snapshot(),
+                                               protocol=pickle.HIGHEST_PROTOCOL)
+                        encoded_name = name.encode()
+                        f.write(_NAME_LENGTH.pack(len(encoded_name)))
+                        f.write(encoded_name)
+                        f.write(_SECTION.pack(store.SNAPSHOT_VERSION, len(payload),
+                                              zlib.crc32(payload)))
+                        f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        return size
+
+    def restore(self):
+        """
+        Load the snapshot file into the registered stores.
+
+        A missing file is a cold start. Sections for unknown stores or with a
+        different store version are skipped.
+
+        Every section is checked and unpickled before any store is touched,
+        so a bad section leaves all stores as they were. Only a failure inside
+        a store's own restore() can leave earlier stores restored.
+
+        Returns:
+            list: The names of the stores that were restored
+
+        Raises:
+            SnapshotError: If the file is unreadable, truncated, corrupt or of
+                another format, or a store rejects its section
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return []
+        except OSError as error:
+            raise SnapshotError(f'Cannot open snapshot file: {error}') from error
+        with f:
+            try:
+                if os.fstat(f.fileno()).st_size == 0:
+                    raise SnapshotError('Snapshot file is empty')
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as error:
+                raise SnapshotError(f'Cannot map snapshot file: {error}') from error
+            with mapped, memoryview(mapped) as view:
+                sections = self._read_sections(view)
+
+        restored = []
+        for name, state in sections:
+            try:
+                self._stores[name].restore(state)
+            except Exception as error:
+                raise SnapshotError(f'Cannot restore section {name!r}: {error}') from error
+            restored.append(name)
+        return restored
+
+    def _read_sections(self, view):
+        """
+        Check and unpickle the sections of the registered stores.
+
+        Returns:
+            list: (store name, unpickled state) pairs in file order
+        """
+        if len(view) < _HEADER.size:
+            raise SnapshotError('Snapshot file is truncated')
+        magic, format_version, count = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise SnapshotError('Not a snapshot file')
+        if format_version != FORMAT_VERSION:
+            raise SnapshotError(f'Unsupported snapshot format {format_version}')
+
+        sections = []
+        offset = _HEADER.size
+        for _ in range(count):
+            try:
+                (name_length,) = _NAME_LENGTH.unpack_from(view, offset)
+                offset += _NAME_LENGTH.size
+                name = bytes(view[offset:offset + name_length]).decode()
+                offset += name_length
+                version, length, checksum = _SECTION.unpack_from(view, offset)
+                offset += _SECTION.size
+            except (struct.error, UnicodeError):
+                raise SnapshotError('Snapshot file is truncated')
+            if offset + length > len(view):
+                raise SnapshotError('Snapshot file is truncated')
+
+            with view[offset:offset + length] as payload:
+                if zlib.crc32(payload) != checksum:
+                    raise SnapshotError(f'Checksum mismatch in section {name!r}')
+                store = self._stores.get(name)
+                if store is None:
+                    logger.warning('Skipping snapshot of unknown store %r', name)
+                elif version != store.SNAPSHOT_VERSION:
+                    logger.warning('Skipping snapshot of %r: version %d, expected %d',
+                                   name, version, store.SNAPSHOT_VERSION)
+                else:
+                    try:
+                        sections.append((name, pickle.loads(payload)))
+                    except Exception as error:
+                        raise SnapshotError(
+                            f'Cannot unpickle section {name!r}: {error}') from error
+            offset += length
+        return sections
+
+    def start(self, interval):
+        """
+        Save a snapshot every interval seconds in a background thread.
+
+        Calling start() again while the thread is running does nothing. A
+        final snapshot is saved when the interpreter exits.
+
+        Returns:
+            bool: False if another process is already saving to this path
+        """
+        if self._thread is not None:
+            return True
+        with self._save_lock:
+            if self._thread is not None:
+                return True
+            if not self._lock_path():
+                logger.warning('Not saving snapshots: cannot lock %s.lock, '
+                               'is another process saving to it?', self.path)
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,),
+                                            name='snapshot', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+        return True
+
+    def _lock_path(self):
+        """Take the exclusive lock on the snapshot path, if fcntl is available."""
+        if fcntl is None:
+            return True
+        try:
+            lock_file = open(self.path + '.lock', 'a')
+        except OSError:
+            return False
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def stop(self, save=True):
+        """Stop the background thread, saving one last snapshot by default."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+        self._thread = None
+        atexit.unregister(self.stop)
+        try:
+            if save:
+                self.save()
+        finally:
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.save()
+            except Exception:
+                logger.exception('Failed to save snapshot to %s', self.path)
@@ -0,0 +1,247 @@
+"""
+Unit and load tests for admission control.
+"""
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from werkzeug.serving import make_server
+import app as app_module
+from admission import AdmissionController
+
+
+def make_controller(**limit):
+    """Create a controller with a single 'play' route class."""
+    limit.setdefault('max_in_flight', 4)
+    limit.setdefault('target_delay', 0.05)
+    return AdmissionController({'play': limit}, smoothing=1.0, baseline_drift=0.0)
+
+
+class TestAdmissionController:
+    """Test the AdmissionController class."""
+    
+    def test_admits_up_to_max_in_flight(self):
+        controller = make_controller(max_in_flight=2)
+        assert controller.admit('play')
+        assert controller.admit('play')
+        assert not controller.admit('play')
+        controller.release('play', 0.01)
+        assert controller.admit('play')
+        assert controller.stats('play')['in_flight'] == 2
+    
+    def test_sheds_when_queueing_delay_passes_target(self):
+        controller = make_controller(min_in_flight=1)
+        controller.admit('play')
+        controller.release('play', 0.01)
+        controller.admit('play')
+        controller.admit('play')
+        controller.release('play', 0.2)
+        assert controller.stats('play')['queueing_delay'] == pytest.approx(0.19)
+        assert not controller.admit('play')
+    
+    def test_min_in_flight_keeps_measuring_while_shedding(self):
+        controller = make_controller(min_in_flight=1)
+        controller.admit('play')
+        controller.release('play', 0.01)
+        controller.admit('play')
+        controller.release('play', 0.2)
+        assert controller.admit('play')
+        assert not controller.admit('play')
+        controller.release('play', 0.01)
+        assert controller.admit('play')
+        assert controller.admit('play')
+    
+    def test_retry_after_is_at_least_one_second(self):
+        controller = make_controller()
+        assert controller.retry_after('play') == 1
+        controller.admit('play')
+        controller.release('play', 2.5)
+        assert controller.retry_after('play') == 3
+    
+    def test_sheds_requests_that_waited_past_target(self):
+        controller = make_controller(target_delay=0.05)
+        assert not controller.admit('play', queue_wait=0.2)
+        assert controller.admit('play', queue_wait=0.01)
+        assert controller.stats('play')['in_flight'] == 1
+    
+    def test_unknown_route_class(self):
+        with pytest.raises(KeyError):
+            make_controller().admit('missing')
+
+
+@pytest.fixture
+def client():
+    """Create a test client for the Flask app."""
+    app_module.app.config['TESTING'] = True
+    with app_module.app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    """Swap in a small controller for the play route class."""
+    controller = AdmissionController({
+        'play': {'max_in_flight': 4, 'target_delay': 0.02},
+        'read': {'max_in_flight': 64, 'target_delay': 0.1},
+    })
+    monkeypatch.setattr(app_module, 'admission_controller', controller)
+    return controller
+
+
+@pytest.fixture
+def trust_request_start(monkeypatch):
+    """Honour X-Request-Start, as with RPS_TRUST_REQUEST_START=1."""
+    monkeypatch.setattr(app_module, 'TRUST_REQUEST_START', True)
+
+
+class TestAdmissionHooks:
+    """Test admission control on the API."""
+    
+    def test_overloaded_play_is_rejected_early(self, client, controller):
+        for _ in range(4):
+            controller.admit('play')
+        response = client.post('/play/rock')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert 'error' in response.get_json()
+    
+    def test_health_and_choices_are_always_admitted(self, client, controller):
+        for _ in range(4):
+            controller.admit('play')
+        assert client.get('/health').status_code == 200
+        assert client.get('/choices').status_code == 200
+    
+    def test_admitted_requests_are_released(self, client, controller):
+        for _ in range(10):
+            assert client.post('/play/rock').status_code == 200
+        assert client.get('/ruleset').status_code == 200
+        assert controller.stats('play')['in_flight'] == 0
+        assert controller.stats('read')['in_flight'] == 0
+    
+    def test_failed_requests_are_released(self, client, controller):
+        client.post('/play', data='invalid json', content_type='application/json')
+        assert controller.stats('play')['in_flight'] == 0
+    
+    def test_request_start_is_ignored_unless_trusted(self, client, controller):
+        response = client.post('/play/rock',
+                               headers={'X-Request-Start': f't={time.time() - 1:.3f}'})
+        assert response.status_code == 200
+    
+    @pytest.mark.usefixtures('trust_request_start')
+    @pytest.mark.parametrize('header', [
+        lambda now: f't={now - 1:.3f}',
+        lambda now: str(int((now - 1) * 1e3)),
+        lambda now: f't={int((now - 1) * 1e6)}',
+    ])
+    def test_request_that_queued_too_long_is_rejected(self, client, controller, header):
+        response = client.post('/play/rock',
+                               headers={'X-Request-Start': header(time.time())})
+        assert response.status_code == 503
+        assert controller.stats('play')['in_flight'] == 0
+    
+    @pytest.mark.usefixtures('trust_request_start')
+    @pytest.mark.parametrize('header', ['t=garbage', '', 't=', 'nan'])
+    def test_unusable_request_start_is_ignored(self, client, controller, header):
+        response = client.post('/play/rock', headers={'X-Request-Start': header})
+        assert response.status_code == 200
+    
+    @pytest.mark.usefixtures('trust_request_start')
+    def test_fresh_request_start_is_admitted(self, client, controller):
+        response = client.post('/play/rock',
+                               headers={'X-Request-Start': f't={time.time():.3f}'})
+        assert response.status_code == 200
+
+
+@pytest.fixture
+def server(controller):
+    """Serve the app from a real threaded server on a free local port."""
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    thread.join()
+
+
+@pytest.mark.usefixtures('trust_request_start')
+class TestQueueWaitOnServer:
+    """Check queue wait is measured from arrival on a real threaded server."""
+    
+    def post(self, url, headers):
+        request = urllib.request.Request(url + '/play/rock', data=b'',
+                                         headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            with error:
+                return error.code, json.loads(error.read())
+    
+    def test_request_queued_in_front_of_the_server_is_shed(self, server, controller):
+        status, body = self.post(server, {'X-Request-Start': f't={time.time() - 0.5:.3f}'})
+        assert status == 503
+        assert 'error' in body
+        assert controller.stats('play')['in_flight'] == 0
+    
+    def test_request_without_header_falls_back_to_latency_estimate(self, server, controller):
+        status, body = self.post(server, {})
+        assert status == 200
+        assert body['user_choice'] == 'rock'
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+@pytest.mark.skipif(not os.environ.get('RPS_LOAD_TESTS'),
+                    reason='timing-sensitive; set RPS_LOAD_TESTS=1 to run')
+class TestLoadShedding:
+    """Drive /play at five times its capacity and check latency stays bounded."""
+    
+    WORKERS = 2
+    SERVICE_TIME = 0.01
+    OVERLOAD = 5
+    DURATION = 0.6
+    
+    def test_p99_stays_bounded_under_overload(self, controller, monkeypatch):
+        # Model a server that can only work on WORKERS plays at once
+        capacity = threading.Semaphore(self.WORKERS)
+        choose = app_module.get_computer_choice
+        
+        def slow_computer_choice():
+            with capacity:
+                time.sleep(self.SERVICE_TIME)
+            return choose()
+        
+        monkeypatch.setattr(app_module, 'get_computer_choice', slow_computer_choice)
+        client = app_module.app.test_client()
+        
+        def timed(method, path, arrival):
+            status = method(path).status_code
+            return status, time.perf_counter() - arrival
+        
+        rate = self.OVERLOAD * self.WORKERS / self.SERVICE_TIME
+        start = time.perf_counter()
+        plays, checks = [], []
+        with ThreadPoolExecutor(max_workers=64) as pool:
+            for n in range(int(rate * self.DURATION)):
+                arrival = start + n / rate
+                time.sleep(max(0.0, arrival - time.perf_counter()))
+                plays.append(pool.submit(timed, client.post, '/play/rock', arrival))
+                if n % 50 == 0:
+                    checks.append(pool.submit(timed, client.get, '/health', arrival))
+        
+        plays = [future.result() for future in plays]
+        admitted = [latency for status, latency in plays if status == 200]
+        rejected = [latency for status, latency in plays if status == 503]
+        assert len(admitted) + len(rejected) == len(plays)
+        assert len(rejected) > len(plays) / 2
+        assert len(admitted) > 0.5 * self.WORKERS / self.SERVICE_TIME * self.DURATION
+        assert percentile(admitted, 0.99) < 10 * self.SERVICE_TIME
+        assert percentile(rejected, 0.99) < 10 * self.SERVICE_TIME
+        assert all(status == 200 for status, _ in (future.result() for future in checks))
@@ -3,7 +3,9 @@ Unit tests for the Rock, Paper, Scissors, Lizard, Spock REST API.
 """
 import pytest
 import json
-from app import app
+import threading
+import app as app_module
+from app import app, response_cache
 from main import CHOICES
 
 
@@ -107,6 +109,24 @@ class TestPlayEndpointWithJSON:
                               data='invalid json',
                               content_type='application/json')
         assert response.status_code == 400
+    
+    def test_play_with_non_string_choice(self, client):
+        response = client.post('/play',
+                              data=json.dumps({'choice': ['rock']}),
+                              content_type='application/json')
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid choice'
+    
+    def test_play_with_non_object_body(self, client):
+        response = client.post('/play',
+                              data=json.dumps(['choice']),
+                              content_type='application/json')
+        assert response.status_code == 400
+        assert 'Missing choice' in response.get_json()['error']
+    
+    def test_play_without_json_content_type(self, client):
+        response = client.post('/play', data=json.dumps({'choice': 'rock'}))
+        assert response.status_code == 415
 
 
 class TestPlayEndpointWithPath:
@@ -159,6 +179,265 @@ class TestPlayEndpointWithPath:
         assert data['error'] == 'Invalid choice'
 
 
+def send_while_held(monkeypatch, module, name, send):
+    """
+    Send two requests, the second while the first is held inside module.name.
+    
+    Each request gets its own client, as a client cannot be shared between
+    threads.
+    
+    Returns:
+        tuple: (first response, second response)
+    """
+    entered, resume = threading.Event(), threading.Event()
+    original = getattr(module, name)
+    
+    def held(*args, **kwargs):
+        entered.set()
+        resume.wait(5)
+        return original(*args, **kwargs)
+    
+    monkeypatch.setattr(module, name, held)
+    responses = []
+    thread = threading.Thread(target=lambda: responses.append(send(app.test_client())))
+    thread.start()
+    try:
+        assert entered.wait(5)
+        monkeypatch.setattr(module, name, original)
+        second = send(app.test_client())
+    finally:
+        resume.set()
+        thread.join()
+    return responses[0], second
+
+
+class TestIdempotentPlay:
+    """Test Idempotency-Key replay on the play endpoints."""
+    
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        response_cache.clear()
+        yield
+        response_cache.clear()
+    
+    def test_retry_with_json_returns_identical_bytes(self, client):
+        responses = [client.post('/play',
+                                 data=json.dumps({'choice': 'rock'}),
+                                 content_type='application/json',
+                                 headers={'Idempotency-Key': 'retry-json'})
+                     for _ in range(20)]
+        assert len({response.data for response in responses}) == 1
+        assert all(response.status_code == 200 for response in responses)
+        assert 'Idempotent-Replayed' not in responses[0].headers
+        assert responses[1].headers['Idempotent-Replayed'] == 'true'
+    
+    def test_retry_with_path_returns_identical_bytes(self, client):
+        responses = [client.post('/play/spock',
+                                 headers={'Idempotency-Key': 'retry-path'})
+                     for _ in range(20)]
+        assert len({response.data for response in responses}) == 1
+        assert responses[-1].content_type == responses[0].content_type
+    
+    def test_keys_are_scoped_to_path(self, client):
+        rock = client.post('/play/rock', headers={'Idempotency-Key': 'shared'})
+        paper = client.post('/play/paper', headers={'Idempotency-Key': 'shared'})
+        assert rock.get_json()['user_choice'] == 'rock'
+        assert paper.get_json()['user_choice'] == 'paper'
+    
+    def test_error_responses_are_not_cached(self, client):
+        first = client.post('/play', data=json.dumps({'choice': 'banana'}),
+                            content_type='application/json',
+                            headers={'Idempotency-Key': 'fixed'})
+        assert first.status_code == 400
+        assert len(response_cache) == 0
+        second = client.post('/play', data=json.dumps({'choice': 'rock'}),
+                             content_type='application/json',
+                             headers={'Idempotency-Key': 'fixed'})
+        assert second.status_code == 200
+        assert second.get_json()['user_choice'] == 'rock'
+    
+    def test_key_reused_with_different_body_is_rejected(self, client):
+        rock = client.post('/play', data=json.dumps({'choice': 'rock'}),
+                           content_type='application/json',
+                           headers={'Idempotency-Key': 'reused'})
+        paper = client.post('/play', data=json.dumps({'choice': 'paper'}),
+                            content_type='application/json',
+                            headers={'Idempotency-Key': 'reused'})
+        assert rock.status_code == 200
+        assert paper.status_code == 422
+        assert 'error' in paper.get_json()
+    
+    def test_keys_are_scoped_to_session(self, client):
+        first = client.post('/play/rock', headers={'Idempotency-Key': 'same',
+                                                   'X-Session-Id': 'scoped-first'})
+        second = client.post('/play/rock', headers={'Idempotency-Key': 'same',
+                                                    'X-Session-Id': 'scoped-second'})
+        assert first.status_code == second.status_code == 200
+        assert 'Idempotent-Replayed' not in second.headers
+        games = client.get('/history/scoped-second').get_json()['games']
+        assert len(games) == 1
+    
+    def test_retry_while_original_is_running(self, client, monkeypatch):
+        headers = {'Idempotency-Key': 'in-flight', 'X-Session-Id': 'in-flight'}
+        first, concurrent = send_while_held(
+            monkeypatch, app_module, 'get_computer_choice',
+            lambda client: client.post('/play/rock', headers=headers))
+        assert first.status_code == 200
+        assert concurrent.status_code == 409
+        assert concurrent.headers['Retry-After'] == '1'
+        retry = client.post('/play/rock', headers=headers)
+        assert retry.data == first.data
+        games = client.get('/history/in-flight').get_json()['games']
+        assert len(games) == 1
+    
+    def test_oversized_key_is_rejected(self, client):
+        response = client.post('/play/rock',
+                               headers={'Idempotency-Key': 'k' * 256})
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+    
+    def test_requests_without_key_are_not_cached(self, client):
+        client.post('/play/rock')
+        assert len(response_cache) == 0
+
+
+class TestHistoryEndpoint:
+    """Test the /history/<session> endpoint."""
+    
+    def play(self, client, session, choice='rock'):
+        return client.post(f'/play/{choice}', headers={'X-Session-Id': session})
+    
+    def test_unknown_session_is_empty(self, client):
+        response = client.get('/history/nobody')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['games'] == []
+        assert data['next_cursor'] is None
+    
+    def test_plays_are_recorded_newest_first(self, client):
+        first = self.play(client, 'recorded', 'rock').get_json()
+        client.post('/play', data=json.dumps({'choice': 'spock'}),
+                    content_type='application/json',
+                    headers={'X-Session-Id': 'recorded'})
+        data = client.get('/history/recorded').get_json()
+        assert data['fields'] == ['id', 'timestamp', 'user_choice',
+                                  'computer_choice', 'result']
+        assert [game[2] for game in data['games']] == ['spock', 'rock']
+        assert data['games'][1][3:] == [first['computer_choice'], first['result']]
+    
+    def test_plays_without_session_are_not_recorded(self, client):
+        client.post('/play/rock')
+        assert client.get('/history/').status_code == 404
+    
+    def test_pagination(self, client):
+        for _ in range(5):
+            self.play(client, 'paged')
+        page = client.get('/history/paged?limit=3').get_json()
+        assert [game[0] for game in page['games']] == [4, 3, 2]
+        page = client.get(f"/history/paged?limit=3&cursor={page['next_cursor']}").get_json()
+        assert [game[0] for game in page['games']] == [1, 0]
+        assert page['next_cursor'] is None
+    
+    def test_filters(self, client):
+        for choice in ['rock', 'paper', 'rock']:
+            self.play(client, 'filtered', choice)
+        data = client.get('/history/filtered?move=ROCK').get_json()
+        assert [game[2] for game in data['games']] == ['rock', 'rock']
+        for result in ['user', 'computer', 'tie']:
+            data = client.get(f'/history/filtered?result={result}').get_json()
+            assert all(game[4] == result for game in data['games'])
+    
+    @pytest.mark.parametrize('query', ['result=win', 'move=banana', 'limit=0',
+                                       'limit=101', 'limit=abc', 'limit=²', 'cursor=!!!'])
+    def test_invalid_query(self, client, query):
+        self.play(client, 'invalid')
+        response = client.get(f'/history/invalid?{query}')
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+
+class TestRulesetEndpoints:
+    """Test the /ruleset and /results endpoints."""
+    
+    def test_get_ruleset(self, client):
+        response = client.get('/ruleset')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['choices'] == CHOICES
+        assert data['results'] == ['user', 'computer', 'tie']
+        assert len(data['outcomes']) == len(CHOICES)
+        assert response.headers['ETag'] == f'"{data["version"]}"'
+        assert 'max-age' in response.headers['Cache-Control']
+    
+    def test_get_ruleset_not_modified(self, client):
+        etag = client.get('/ruleset').headers['ETag']
+        response = client.get('/ruleset', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+    
+    def submit(self, client, body, headers=None):
+        return client.post('/results', data=json.dumps(body), headers=headers,
+                           content_type='application/json')
+    
+    def test_submit_results(self, client):
+        version = client.get('/ruleset').get_json()['version']
+        response = self.submit(client, {'ruleset': version,
+                                        'rounds': [[0, 2, 0], [0, 0, 2], [0, 1, 2]]})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['accepted'] == 2
+        assert data['rejected'] == [2]
+        assert data['totals'] == {'user': 1, 'computer': 0, 'tie': 1}
+        assert 'session_totals' not in data
+    
+    def test_submit_results_records_session_totals(self, client):
+        version = client.get('/ruleset').get_json()['version']
+        headers = {'X-Session-Id': 'practice'}
+        before = client.get('/practice/practice').get_json()['totals']
+        self.submit(client, {'ruleset': version, 'rounds': [[0, 2, 0], [0, 1, 2]]}, headers)
+        response = self.submit(client, {'ruleset': version, 'rounds': [[0, 0, 2]]}, headers)
+        expected = dict(before, user=before['user'] + 1, tie=before['tie'] + 1)
+        assert response.get_json()['session_totals'] == expected
+        data = client.get('/practice/practice').get_json()
+        assert data == {'session': 'practice', 'totals': expected}
+        assert client.get('/history/practice').get_json()['games'] == []
+    
+    def test_submit_results_retry_is_counted_once(self, client):
+        version = client.get('/ruleset').get_json()['version']
+        headers = {'X-Session-Id': 'practice-retry', 'Idempotency-Key': 'batch-1'}
+        body = {'ruleset': version, 'rounds': [[0, 2, 0]]}
+        first = self.submit(client, body, headers)
+        retry = self.submit(client, body, headers)
+        assert retry.get_data() == first.get_data()
+        assert client.get('/practice/practice-retry').get_json()['totals']['user'] == 1
+    
+    def test_concurrent_retry_is_counted_once(self, client, monkeypatch):
+        version = client.get('/ruleset').get_json()['version']
+        headers = {'X-Session-Id': 'practice-concurrent', 'Idempotency-Key': 'b1'}
+        body = {'ruleset': version, 'rounds': [[0, 2, 0]]}
+        first, concurrent = send_while_held(
+            monkeypatch, app_module.ruleset, 'validate_rounds',
+            lambda client: self.submit(client, body, headers))
+        assert first.status_code == 200
+        assert concurrent.status_code == 409
+        assert self.submit(client, body, headers).data == first.data
+        totals = client.get('/practice/practice-concurrent').get_json()['totals']
+        assert totals == {'user': 1, 'computer': 0, 'tie': 0}
+    
+    def test_submit_results_with_stale_ruleset(self, client):
+        response = self.submit(client, {'ruleset': 'stale', 'rounds': []})
+        assert response.status_code == 409
+        assert response.get_json()['ruleset'] == client.get('/ruleset').get_json()['version']
+    
+    @pytest.mark.parametrize('body', [{}, {'rounds': 'abc'}, ['rounds']])
+    def test_submit_results_without_rounds(self, client, body):
+        assert self.submit(client, body).status_code == 400
+    
+    def test_submit_results_batch_too_large(self, client):
+        version = client.get('/ruleset').get_json()['version']
+        response = self.submit(client, {'ruleset': version, 'rounds': [[0, 0, 2]] * 10001})
+        assert response.status_code == 413
+
+
 class TestChoicesEndpoint:
     """Test the /choices endpoint."""
     
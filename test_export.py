@@ -0,0 +1,136 @@
+"""
+Unit tests for the columnar game export.
+"""
+import io
+import pytest
+import app as app_module
+from app import app, game_history
+from history import GameHistory
+from main import CHOICES, determine_winner
+import export
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+@pytest.fixture
+def history():
+    """Create a history with every (user, computer) pair in two sessions."""
+    history = GameHistory()
+    for session in ['a', 'b']:
+        for user_choice in CHOICES:
+            for computer_choice in CHOICES:
+                history.record(session, user_choice, computer_choice,
+                               determine_winner(user_choice, computer_choice),
+                               timestamp=1760000000.5)
+    return history
+
+
+class TestExport:
+    """Test writing games to Parquet and Arrow."""
+    
+    def test_parquet_round_trip(self, history):
+        sink = io.BytesIO()
+        assert export.write(history, sink, 'parquet') == 50
+        table = pq.read_table(io.BytesIO(sink.getvalue()))
+        rows = table.to_pylist()
+        assert len(rows) == 50
+        assert rows[0]['session'] == 'a'
+        assert rows[0]['id'] == 0
+        assert rows[0]['timestamp'].timestamp() == 1760000000.5
+        assert rows[1]['user_choice'] == 'rock'
+        assert rows[1]['computer_choice'] == 'paper'
+        assert rows[1]['result'] == 'computer'
+        assert rows[25]['session'] == 'b'
+        assert rows[25]['id'] == 0
+    
+    def test_move_columns_are_dictionary_encoded(self, history):
+        batch = next(export.iter_record_batches(history))
+        column = batch.column('user_choice')
+        assert pa.types.is_dictionary(column.type)
+        assert column.dictionary.to_pylist() == CHOICES
+    
+    def test_row_groups_follow_chunk_size(self, history):
+        sink = io.BytesIO()
+        export.write(history, sink, 'parquet', chunk_size=20)
+        assert pq.ParquetFile(io.BytesIO(sink.getvalue())).num_row_groups == 3
+    
+    @pytest.mark.parametrize('fmt', ['arrow', 'parquet'])
+    def test_stream_yields_one_part_per_chunk(self, history, fmt):
+        parts = list(export.stream(history, fmt, chunk_size=10))
+        assert len(parts) == 6
+        data = b''.join(parts)
+        if fmt == 'arrow':
+            table = pa.ipc.open_stream(data).read_all()
+        else:
+            table = pq.read_table(io.BytesIO(data))
+        assert table.num_rows == 50
+    
+    def test_empty_history(self):
+        table = pa.ipc.open_stream(b''.join(export.stream(GameHistory()))).read_all()
+        assert table.num_rows == 0
+        assert table.schema == export.schema()
+    
+    def test_unknown_format(self, history):
+        with pytest.raises(ValueError):
+            export.write(history, io.BytesIO(), 'csv')
+
+
+class TestExportEndpoint:
+    """Test the /export endpoint."""
+    
+    TOKEN = 'operator-secret'
+    
+    @pytest.fixture
+    def client(self, monkeypatch):
+        monkeypatch.setattr(app_module, 'EXPORT_TOKEN', self.TOKEN)
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            client.post('/play/rock', headers={'X-Session-Id': 'exported'})
+            yield client
+    
+    def get(self, client, path, token=TOKEN):
+        return client.get(path, buffered=True,
+                          headers={'Authorization': f'Bearer {token}'})
+    
+    def test_stream_arrow(self, client):
+        response = self.get(client, '/export')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/vnd.apache.arrow.stream'
+        table = pa.ipc.open_stream(response.data).read_all()
+        assert table.num_rows == len(game_history)
+        assert 'exported' in table.column('session').to_pylist()
+    
+    def test_stream_parquet(self, client):
+        response = self.get(client, '/export?format=parquet')
+        assert response.status_code == 200
+        assert 'games.parquet' in response.headers['Content-Disposition']
+        assert pq.read_table(io.BytesIO(response.data)).num_rows == len(game_history)
+    
+    def test_invalid_format(self, client):
+        response = self.get(client, '/export?format=csv')
+        assert response.status_code == 400
+        assert 'valid_formats' in response.get_json()
+    
+    @pytest.mark.parametrize('headers', [{}, {'Authorization': 'Bearer wrong'},
+                                         {'Authorization': f'Basic {TOKEN}'}])
+    def test_requires_operator_token(self, client, headers):
+        response = client.get('/export', headers=headers)
+        assert response.status_code == 401
+        assert response.headers['WWW-Authenticate'] == 'Bearer'
+    
+    def test_disabled_without_token(self, client, monkeypatch):
+        monkeypatch.setattr(app_module, 'EXPORT_TOKEN', None)
+        assert self.get(client, '/export').status_code == 403
+    
+    def test_admitted_until_stream_is_closed(self, client):
+        controller = app_module.admission_controller
+        streams = [client.get('/export', buffered=False,
+                              headers={'Authorization': f'Bearer {self.TOKEN}'})
+                   for _ in range(2)]
+        assert all(response.status_code == 200 for response in streams)
+        assert controller.stats('export')['in_flight'] == 2
+        assert self.get(client, '/export').status_code == 503
+        for response in streams:
+            response.close()
+        assert controller.stats('export')['in_flight'] == 0
@@ -0,0 +1,137 @@
+"""
+Unit tests for the per-session game history.
+"""
+import pytest
+from history import GameHistory, encode_cursor, decode_cursor
+
+
+@pytest.fixture
+def history():
+    """Create a history with ten games in session 'a'."""
+    history = GameHistory()
+    moves = ['rock', 'paper', 'scissors', 'lizard', 'spock']
+    results = ['user', 'computer', 'tie']
+    for i in range(10):
+        history.record('a', moves[i % 5], 'rock', results[i % 3], timestamp=float(i))
+    return history
+
+
+class TestCursor:
+    """Test cursor encoding."""
+    
+    def test_round_trip(self):
+        assert decode_cursor(encode_cursor(12345)) == 12345
+    
+    @pytest.mark.parametrize('cursor', ['', '!!!', encode_cursor(-1), 'bm90YW51bWJlcg'])
+    def test_invalid_cursor(self, cursor):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+
+class TestGameHistory:
+    """Test the GameHistory class."""
+    
+    def test_unknown_session_is_empty(self, history):
+        assert history.page('missing') == ([], None)
+    
+    def test_pages_are_newest_first(self, history):
+        games, next_cursor = history.page('a', limit=3)
+        assert [position for position, _ in games] == [9, 8, 7]
+        assert [game.timestamp for _, game in games] == [9.0, 8.0, 7.0]
+        assert next_cursor is not None
+    
+    def test_cursor_walks_every_game_once(self, history):
+        positions = []
+        cursor = None
+        while True:
+            games, cursor = history.page('a', limit=4, cursor=cursor)
+            positions.extend(position for position, _ in games)
+            if cursor is None:
+                break
+        assert positions == list(range(9, -1, -1))
+    
+    def test_filter_by_result(self, history):
+        games, next_cursor = history.page('a', result='user')
+        assert [position for position, _ in games] == [9, 6, 3, 0]
+        assert next_cursor is None
+    
+    def test_filter_by_move(self, history):
+        games, _ = history.page('a', move='rock')
+        assert [position for position, _ in games] == [5, 0]
+    
+    def test_filter_by_result_and_move(self, history):
+        games, _ = history.page('a', result='user', move='rock')
+        assert [position for position, _ in games] == [0]
+    
+    def test_filtered_pagination(self, history):
+        games, cursor = history.page('a', limit=2, result='user')
+        assert [position for position, _ in games] == [9, 6]
+        games, cursor = history.page('a', limit=2, cursor=cursor, result='user')
+        assert [position for position, _ in games] == [3, 0]
+        assert cursor is None
+    
+    def test_sessions_are_separate(self, history):
+        history.record('b', 'spock', 'rock', 'user')
+        games, _ = history.page('b')
+        assert len(games) == 1
+        assert len(history) == 11
+    
+    def test_invalid_cursor_raises(self, history):
+        with pytest.raises(ValueError):
+            history.page('a', cursor='!!!')
+    
+    def test_iter_chunks_covers_every_game(self, history):
+        history.record('b', 'spock', 'rock', 'user')
+        chunks = list(history.iter_chunks(4))
+        assert [sum(len(games) for _, games in chunk) for chunk in chunks] == [4, 4, 3]
+        assert [(start, len(games)) for start, games in chunks[2]] == [(8, 2), (0, 1)]
+        games = [(game.session, start + offset) for chunk in chunks
+                 for start, run in chunk for offset, game in enumerate(run)]
+        assert games == [('a', i) for i in range(10)] + [('b', 0)]
+
+
+class TestGameHistoryBudget:
+    """Test that GameHistory stays within its budget."""
+    
+    def test_session_keeps_its_newest_games(self):
+        history = GameHistory(max_session_games=8)
+        for i in range(9):
+            history.record('a', 'rock', 'rock', 'tie', timestamp=float(i))
+        assert len(history) == 6
+        games, next_cursor = history.page('a', limit=10)
+        assert [position for position, _ in games] == [8, 7, 6, 5, 4, 3]
+        assert [game.timestamp for _, game in games] == [8.0, 7.0, 6.0, 5.0, 4.0, 3.0]
+        assert next_cursor is None
+    
+    def test_trimmed_session_keeps_filters_and_cursors(self):
+        history = GameHistory(max_session_games=8)
+        for i in range(12):
+            history.record('a', 'rock' if i % 2 else 'paper', 'rock', 'tie')
+        games, cursor = history.page('a', limit=2, move='rock')
+        assert [position for position, _ in games] == [11, 9]
+        games, cursor = history.page('a', limit=10, cursor=cursor, move='rock')
+        assert [position for position, _ in games] == [7]
+        assert history.page('a', cursor=encode_cursor(5)) == ([], None)
+        chunks = list(history.iter_chunks(100))
+        assert [(start, len(run)) for start, run in chunks[0]] == [(6, 6)]
+    
+    def test_least_recently_used_session_is_evicted(self):
+        history = GameHistory(max_sessions=2)
+        history.record('a', 'rock', 'rock', 'tie')
+        history.record('b', 'rock', 'rock', 'tie')
+        history.page('a')
+        history.record('c', 'rock', 'rock', 'tie')
+        assert history.page('b') == ([], None)
+        assert len(history.page('a')[0]) == 1
+        assert len(history) == 2
+    
+    def test_sessions_are_evicted_to_stay_under_game_budget(self):
+        history = GameHistory(max_games=4, max_session_games=4)
+        for session in ['a', 'a', 'b', 'b', 'c']:
+            history.record(session, 'rock', 'rock', 'tie')
+        assert history.page('a') == ([], None)
+        assert len(history) == 3
+    
+    def test_session_budget_must_fit_game_budget(self):
+        with pytest.raises(ValueError):
+            GameHistory(max_games=10, max_session_games=20)
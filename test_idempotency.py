@@ -0,0 +1,101 @@
+"""
+Unit tests for the Idempotency-Key response cache.
+"""
+import threading
+import pytest
+from idempotency import ResponseCache, CachedResponse
+
+
+def make_response(body=b'{}'):
+    return CachedResponse(body, 200, 'application/json', b'')
+
+
+class TestResponseCache:
+    """Test the ResponseCache class."""
+    
+    def test_get_missing_key(self):
+        cache = ResponseCache(shards=1)
+        assert cache.get('missing') is None
+    
+    def test_put_then_get(self):
+        cache = ResponseCache(shards=1)
+        response = make_response(b'{"result":"user"}')
+        assert cache.put_if_absent('key', response) is response
+        assert cache.get('key') is response
+    
+    def test_put_if_absent_keeps_first_response(self):
+        cache = ResponseCache(shards=1)
+        first = make_response(b'first')
+        second = make_response(b'second')
+        cache.put_if_absent('key', first)
+        assert cache.put_if_absent('key', second) is first
+        assert cache.get('key') is first
+    
+    def test_entries_expire_after_ttl(self):
+        cache = ResponseCache(shards=1, ttl=0)
+        cache.put_if_absent('key', make_response())
+        assert cache.get('key') is None
+        assert len(cache) == 0
+    
+    def test_evicts_least_recently_used_entry(self):
+        cache = ResponseCache(max_entries=2, shards=1)
+        cache.put_if_absent('a', make_response())
+        cache.put_if_absent('b', make_response())
+        cache.get('a')
+        cache.put_if_absent('c', make_response())
+        assert cache.get('a') is not None
+        assert cache.get('b') is None
+        assert cache.get('c') is not None
+    
+    def test_evicts_to_stay_under_byte_limit(self):
+        cache = ResponseCache(max_bytes=250, shards=1)
+        cache.put_if_absent('a', make_response(b'x' * 100))
+        cache.put_if_absent('b', make_response(b'x' * 100))
+        cache.put_if_absent('c', make_response(b'x' * 100))
+        assert cache.get('a') is None
+        assert len(cache) == 2
+    
+    def test_oversized_response_is_not_stored(self):
+        cache = ResponseCache(max_bytes=50, shards=1)
+        response = make_response(b'x' * 100)
+        assert cache.put_if_absent('key', response) is response
+        assert cache.get('key') is None
+    
+    def test_clear(self):
+        cache = ResponseCache()
+        for i in range(20):
+            cache.put_if_absent(i, make_response())
+        cache.clear()
+        assert len(cache) == 0
+    
+    def test_claim_is_exclusive_until_released(self):
+        cache = ResponseCache()
+        assert cache.claim('key') == (None, True)
+        assert cache.claim('key') == (None, False)
+        cache.release('key')
+        assert cache.claim('key') == (None, True)
+        assert len(cache) == 0
+    
+    def test_claim_returns_cached_response(self):
+        cache = ResponseCache()
+        response = make_response(b'{}')
+        cache.put_if_absent('key', response)
+        assert cache.claim('key') == (response, False)
+    
+    def test_limits_must_cover_every_shard(self):
+        with pytest.raises(ValueError):
+            ResponseCache(max_entries=4, shards=16)
+    
+    def test_concurrent_puts_agree_on_one_response(self):
+        cache = ResponseCache()
+        winners = []
+        
+        def worker(n):
+            winners.append(cache.put_if_absent('key', make_response(str(n).encode())))
+        
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len({id(winner) for winner in winners}) == 1
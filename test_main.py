@@ -2,7 +2,7 @@
 Unit tests for the Rock, Paper, Scissors, Lizard, Spock game.
 """
 import pytest
-from main import determine_winner, is_valid_choice, get_computer_choice, CHOICES, WINS
+from main import determine_winner, is_valid_choice, get_computer_choice, CHOICES, WINS, RESULTS
 
 
 class TestDetermineWinner:
@@ -309,3 +309,12 @@ class TestWinLogic:
         """Spock smashes scissors."""
         assert determine_winner('spock', 'scissors') == 'user'
         assert determine_winner('scissors', 'spock') == 'computer'
+
+
+class TestResults:
+    """Test the result codes."""
+    
+    def test_determine_winner_returns_result_codes(self):
+        outcomes = {determine_winner(user_choice, computer_choice)
+                    for user_choice in CHOICES for computer_choice in CHOICES}
+        assert outcomes == set(RESULTS)
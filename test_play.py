@@ -0,0 +1,57 @@
+"""
+Unit tests for the precomputed play tables.
+"""
+import json
+import pytest
+from flask import jsonify
+from app import app
+from main import CHOICES, determine_winner
+import play
+
+
+class TestEncode:
+    """Test that pre-encoded bodies match jsonify."""
+    
+    @pytest.mark.parametrize('obj', [
+        {'user_choice': 'rock', 'computer_choice': 'spock',
+         'result': 'computer', 'message': 'Computer wins!'},
+        {'error': 'Invalid choice', 'valid_choices': CHOICES},
+        {'message': "It's a tie!"},
+    ])
+    def test_matches_jsonify(self, obj):
+        with app.app_context():
+            assert play.encode(obj) == jsonify(obj).get_data()
+
+
+class TestTables:
+    """Test the precomputed choice, outcome and body tables."""
+    
+    @pytest.mark.parametrize('raw', ['rock', 'ROCK', 'RoCk', 'sCiSsOrS', 'Spock'])
+    def test_lookup_any_case(self, raw):
+        assert play.lookup_choice(raw) == raw.lower()
+    
+    def test_lookup_unicode_lowercase(self):
+        assert play.lookup_choice('ROC\u212a') == 'rock'
+    
+    @pytest.mark.parametrize('raw', ['banana', '', ' rock', None, 1, ['rock'], {'rock': 1}])
+    def test_lookup_invalid(self, raw):
+        assert play.lookup_choice(raw) is None
+    
+    def test_outcomes_match_determine_winner(self):
+        for user_choice in CHOICES:
+            for computer_choice in CHOICES:
+                assert (play.OUTCOMES[user_choice, computer_choice]
+                        == determine_winner(user_choice, computer_choice))
+    
+    def test_play_bodies(self):
+        assert len(play.PLAY_BODIES) == len(CHOICES) ** 2
+        for (user_choice, computer_choice), body in play.PLAY_BODIES.items():
+            data = json.loads(body)
+            assert data['user_choice'] == user_choice
+            assert data['computer_choice'] == computer_choice
+            assert data['result'] == play.OUTCOMES[user_choice, computer_choice]
+            assert data['message'] == play.MESSAGES[data['result']]
+    
+    def test_loads_rejects_invalid_json_with_value_error(self):
+        with pytest.raises(ValueError):
+            play.loads(b'invalid json')
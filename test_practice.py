@@ -0,0 +1,44 @@
+"""
+Unit tests for the practice round totals.
+"""
+import pytest
+from practice import PracticeTally
+
+
+class TestPracticeTally:
+    """Test adding up and snapshotting practice totals."""
+    
+    def test_add_accumulates(self):
+        tally = PracticeTally()
+        tally.add('a', {'user': 1, 'computer': 0, 'tie': 2})
+        totals = tally.add('a', {'user': 3, 'computer': 1, 'tie': 0})
+        assert totals == {'user': 4, 'computer': 1, 'tie': 2}
+        assert tally.totals('a') == totals
+    
+    def test_unknown_session_is_zero(self):
+        assert PracticeTally().totals('missing') == {'user': 0, 'computer': 0, 'tie': 0}
+    
+    def test_least_recently_used_session_is_evicted(self):
+        tally = PracticeTally(max_sessions=2)
+        tally.add('a', {'user': 1})
+        tally.add('b', {'user': 1})
+        tally.totals('a')
+        tally.add('c', {'user': 1})
+        assert len(tally) == 2
+        assert tally.totals('a')['user'] == 1
+        assert tally.totals('b')['user'] == 0
+    
+    def test_snapshot_round_trip(self):
+        tally = PracticeTally()
+        tally.add('a', {'user': 1, 'computer': 2, 'tie': 3})
+        restored = PracticeTally()
+        restored.add('b', {'tie': 1})
+        restored.restore(tally.snapshot())
+        assert restored.totals('a') == {'user': 1, 'computer': 2, 'tie': 3}
+        assert restored.totals('b') == {'user': 0, 'computer': 0, 'tie': 1}
+    
+    def test_restore_rejects_malformed_state(self):
+        tally = PracticeTally()
+        with pytest.raises(ValueError):
+            tally.restore([('a', [1, 2])])
+        assert len(tally) == 0
@@ -0,0 +1,49 @@
+"""
+Unit tests for the compiled ruleset.
+"""
+import json
+import pytest
+from main import CHOICES, RESULTS, determine_winner
+import ruleset
+
+
+class TestRuleset:
+    """Test the compiled outcome table."""
+    
+    def test_outcomes_match_determine_winner(self):
+        for user, user_choice in enumerate(CHOICES):
+            for computer, computer_choice in enumerate(CHOICES):
+                result = RESULTS[ruleset.OUTCOME_CODES[user][computer]]
+                assert result == determine_winner(user_choice, computer_choice)
+    
+    def test_body(self):
+        data = json.loads(ruleset.BODY)
+        assert data['version'] == ruleset.VERSION
+        assert data['choices'] == CHOICES
+        assert data['results'] == list(RESULTS)
+        assert data['outcomes'] == ruleset.OUTCOME_CODES
+
+
+class TestValidateRounds:
+    """Test the validate_rounds function."""
+    
+    def test_every_valid_round_is_accepted(self):
+        rounds = [[user, computer, result]
+                  for user, row in enumerate(ruleset.OUTCOME_CODES)
+                  for computer, result in enumerate(row)]
+        totals, rejected = ruleset.validate_rounds(rounds)
+        assert rejected == []
+        assert totals == {'user': 10, 'computer': 10, 'tie': 5}
+    
+    def test_wrong_result_is_rejected(self):
+        # rock (0) against scissors (2) is a user win (0), not a tie (2)
+        totals, rejected = ruleset.validate_rounds([[0, 2, 0], [0, 2, 2]])
+        assert rejected == [1]
+        assert totals == {'user': 1, 'computer': 0, 'tie': 0}
+    
+    @pytest.mark.parametrize('played', [
+        [0, 0], [0, 0, 2, 0], [5, 0, 0], [-1, 0, 0], [0.0, 0, 2],
+        [True, True, 2], ['rock', 'rock', 'tie'], [[0], 0, 2], 'abc', None, {'0': 0},
+    ])
+    def test_malformed_round_is_rejected(self, played):
+        assert ruleset.validate_rounds([played])[1] == [0]
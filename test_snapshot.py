@@ -0,0 +1,177 @@
+"""
+Unit tests for warm-start snapshots.
+"""
+import os
+import pickle
+import struct
+import zlib
+import pytest
+from history import GameHistory
+from idempotency import ResponseCache, CachedResponse
+from snapshot import SnapshotManager, SnapshotError, MAGIC, FORMAT_VERSION
+
+
+def make_manager(path):
+    """Create a manager with a history and a response cache registered."""
+    manager = SnapshotManager(str(path))
+    history = GameHistory()
+    cache = ResponseCache(shards=2)
+    manager.register('game_history', history)
+    manager.register('response_cache', cache)
+    return manager, history, cache
+
+
+@pytest.fixture
+def saved(tmp_path):
+    """Save a snapshot holding a few games and one cached response."""
+    path = tmp_path / 'state.snapshot'
+    manager, history, cache = make_manager(path)
+    history.record('a', 'rock', 'scissors', 'user', timestamp=1.0)
+    history.record('a', 'paper', 'scissors', 'computer', timestamp=2.0)
+    history.record('b', 'spock', 'spock', 'tie', timestamp=3.0)
+    cache.put_if_absent(('/play/rock', 'key'),
+                        CachedResponse(b'{"result":"user"}\n', 200, 'application/json', b''))
+    manager.save()
+    return path
+
+
+class TestSnapshotManager:
+    """Test saving and restoring snapshots."""
+    
+    def test_round_trip(self, saved):
+        manager, history, cache = make_manager(saved)
+        assert sorted(manager.restore()) == ['game_history', 'response_cache']
+        assert len(history) == 3
+        games, _ = history.page('a', result='computer')
+        assert [(position, game.user_choice) for position, game in games] == [(1, 'paper')]
+        assert cache.get(('/play/rock', 'key')).body == b'{"result":"user"}\n'
+    
+    def test_restored_history_keeps_recording(self, saved):
+        manager, history, _ = make_manager(saved)
+        manager.restore()
+        history.record('a', 'rock', 'paper', 'computer')
+        games, _ = history.page('a', result='computer')
+        assert [position for position, _ in games] == [2, 1]
+    
+    def test_untouched_sessions_survive_another_save(self, saved):
+        manager, history, _ = make_manager(saved)
+        manager.restore()
+        history.record('b', 'rock', 'lizard', 'user')
+        manager.save()
+        manager, history, _ = make_manager(saved)
+        manager.restore()
+        assert len(history) == 4
+        assert [game.user_choice for _, game in history.page('a')[0]] == ['paper', 'rock']
+        assert [game.user_choice for _, game in history.page('b')[0]] == ['rock', 'spock']
+    
+    def test_trimmed_session_round_trip(self, tmp_path):
+        manager = SnapshotManager(str(tmp_path / 'state.snapshot'))
+        history = GameHistory(max_session_games=8)
+        manager.register('game_history', history)
+        for _ in range(9):
+            history.record('a', 'rock', 'rock', 'tie')
+        manager.save()
+        restored = GameHistory()
+        manager.register('game_history', restored)
+        manager.restore()
+        assert len(restored) == 6
+        assert [position for position, _ in restored.page('a')[0]] == [8, 7, 6, 5, 4, 3]
+    
+    def test_missing_file_is_a_cold_start(self, tmp_path):
+        manager, history, _ = make_manager(tmp_path / 'missing.snapshot')
+        assert manager.restore() == []
+        assert len(history) == 0
+    
+    def test_save_replaces_file_atomically(self, saved):
+        manager, history, _ = make_manager(saved)
+        history.record('c', 'rock', 'rock', 'tie')
+        manager.save()
+        assert os.listdir(saved.parent) == [saved.name]
+        manager, history, _ = make_manager(saved)
+        manager.restore()
+        assert len(history) == 1
+    
+    def test_expired_responses_are_not_saved(self, tmp_path):
+        manager = SnapshotManager(str(tmp_path / 'state.snapshot'))
+        cache = ResponseCache(shards=1, ttl=0)
+        manager.register('response_cache', cache)
+        cache.put_if_absent('key', CachedResponse(b'{}', 200, 'application/json', b''))
+        manager.save()
+        restored = ResponseCache(shards=1)
+        manager.register('response_cache', restored)
+        manager.restore()
+        assert len(restored) == 0
+    
+    def test_checksum_mismatch(self, saved):
+        data = bytearray(saved.read_bytes())
+        data[-1] ^= 0xFF
+        saved.write_bytes(bytes(data))
+        with pytest.raises(SnapshotError):
+            make_manager(saved)[0].restore()
+    
+    @pytest.mark.parametrize('data', [b'', MAGIC, b'NOTASNAP\x01\x00\x00\x00'])
+    def test_unreadable_file(self, saved, data):
+        saved.write_bytes(data)
+        with pytest.raises(SnapshotError):
+            make_manager(saved)[0].restore()
+    
+    def test_truncated_file(self, saved):
+        saved.write_bytes(saved.read_bytes()[:-5])
+        with pytest.raises(SnapshotError):
+            make_manager(saved)[0].restore()
+    
+    def test_unopenable_path(self, tmp_path):
+        with pytest.raises(SnapshotError):
+            make_manager(tmp_path)[0].restore()
+    
+    @pytest.mark.parametrize('state', [b'not a pickle', [('a', 1)]])
+    def test_bad_section_with_valid_checksum(self, tmp_path, state):
+        path = tmp_path / 'state.snapshot'
+        payload = state if isinstance(state, bytes) else pickle.dumps(state)
+        path.write_bytes(struct.pack('<8sHH', MAGIC, FORMAT_VERSION, 1)
+                         + struct.pack('<H', 12) + b'game_history'
+                         + struct.pack('<HQI', GameHistory.SNAPSHOT_VERSION,
+                                       len(payload), zlib.crc32(payload))
+                         + payload)
+        manager, history, _ = make_manager(path)
+        with pytest.raises(SnapshotError):
+            manager.restore()
+        assert len(history) == 0
+    
+    def test_unknown_store_is_skipped(self, saved):
+        manager = SnapshotManager(str(saved))
+        history = GameHistory()
+        manager.register('game_history', history)
+        assert manager.restore() == ['game_history']
+        assert len(history) == 3
+    
+    def test_version_mismatch_is_skipped(self, saved):
+        manager, history, _ = make_manager(saved)
+        history.SNAPSHOT_VERSION = GameHistory.SNAPSHOT_VERSION + 1
+        assert manager.restore() == ['response_cache']
+        assert len(history) == 0
+    
+    def test_background_thread_saves_on_stop(self, tmp_path):
+        path = tmp_path / 'state.snapshot'
+        manager, history, _ = make_manager(path)
+        manager.start(interval=60)
+        manager.start(interval=60)
+        history.record('a', 'rock', 'rock', 'tie')
+        manager.stop()
+        manager, history, _ = make_manager(path)
+        manager.restore()
+        assert len(history) == 1
+    
+    def test_second_process_does_not_save(self, tmp_path):
+        path = tmp_path / 'state.snapshot'
+        first, _, _ = make_manager(path)
+        second, _, _ = make_manager(path)
+        assert first.start(interval=60)
+        try:
+            assert not second.start(interval=60)
+            second.stop()
+            assert not path.exists()
+        finally:
+            first.stop()
+        assert second.start(interval=60)
+        second.stop(save=False)